@@ -19,24 +19,17 @@
 Utility functions to facilitate prompting the user with a list of choices.
 """
 
-import readline  # pylint: disable=unused-import  # noqa: F401  # Imported for side-effect.
+import contextlib
+import functools
 import sys
 import typing
 
 
-__flush_input_helper: typing.Optional[typing.Callable[[], None]] = None
-
-
-def flush_input() -> None:
-    """Clears pending input from `sys.stdin` if it is a TTY."""
-    if not sys.stdin.isatty():
-        return
-
-    global __flush_input_helper
-    if __flush_input_helper is not None:
-        __flush_input_helper()
-        return
-
+def _make_flush_input_helper() -> typing.Optional[typing.Callable[[], None]]:
+    """
+    Returns a platform-specific function that clears pending input from
+    `sys.stdin`, or `None` if the platform is unsupported.
+    """
     import importlib  # pylint: disable=import-outside-toplevel
 
     # For POSIX systems.
@@ -48,9 +41,7 @@ def flush_input() -> None:
         def flush_posix() -> None:
             termios.tcflush(sys.stdin, termios.TCIFLUSH)
 
-        __flush_input_helper = flush_posix
-        __flush_input_helper()
-        return
+        return flush_posix
 
     # For Windows systems.
     try:
@@ -62,9 +53,145 @@ def flush_input() -> None:
             while msvcrt.kbhit():
                 msvcrt.getch()
 
-        __flush_input_helper = flush_windows
+        return flush_windows
+
+    return None
+
+
+__flush_input_helper = _make_flush_input_helper()
+
+
+def flush_input() -> None:
+    """Clears pending input from `sys.stdin` if it is a TTY."""
+    if __flush_input_helper is not None and sys.stdin.isatty():
         __flush_input_helper()
-        return
+
+
+def _normalize_choice_str(s: str) -> str:
+    """
+    Transforms a choice string to a standard representation for easier
+    comparison later.
+    """
+    assert isinstance(s, str)
+    s = s.strip()
+
+    # `str.lower` is cheaper than `str.casefold` and is equivalent for ASCII
+    # strings, which is the common case.
+    return s.lower() if s.isascii() else s.casefold()
+
+
+def _default_invalid_handler(response: str) -> str:
+    return f"\"{response}\" is not a valid choice."
+
+
+class _ChoicesPromptState(typing.NamedTuple):
+    """
+    The parts of a `choices_prompt` that do not change across repeated
+    prompts.
+    """
+    choices_table: typing.Dict[str, str]
+    default: typing.Optional[str]
+    invalid_handler: typing.Callable[[str], str]
+
+
+def _make_choices_prompt_state(
+    choices: typing.Union[typing.Collection[str],
+                          typing.Collection[typing.Sequence[str]]],
+    *,
+    default: typing.Optional[str] = None,
+    invalid_handler: typing.Optional[typing.Callable[[str], str]] = None,
+) -> _ChoicesPromptState:
+    """
+    Builds the lookup table and other invariant state used by
+    `choices_prompt`.  See `choices_prompt` for a description of the
+    parameters.
+    """
+    choices_table: typing.Dict[str, str] = {}
+    for choice in choices:
+        # Top-level elements that are single strings are their own canonical
+        # choice.
+        if isinstance(choice, str):
+            choices_table[_normalize_choice_str(choice)] = choice
+            continue
+
+        for choice_str in choice:
+            choices_table[_normalize_choice_str(choice_str)] = choice[0]
+
+    if default is not None:
+        default = _normalize_choice_str(default)
+        assert default in choices_table
+
+    return _ChoicesPromptState(
+        choices_table=choices_table,
+        default=default,
+        invalid_handler=invalid_handler or _default_invalid_handler,
+    )
+
+
+def _read_response(prompt: str) -> str:
+    """
+    Prints `prompt` to `sys.stdout` and reads a line of input from the user.
+
+    Raises `EOFError` if the user enters EOF.
+    """
+    # Imported for its side-effect of adding line-editing to `input`.  Loading
+    # it is relatively expensive, so defer it until we actually prompt.
+    import readline  # pylint: disable=import-outside-toplevel,unused-import  # noqa: F401
+
+    # Answering prompts with already-buffered input (particularly with empty
+    # lines) is potentially dangerous, so disallow it.
+    flush_input()
+    return input(prompt)
+
+
+def _lookup_response(
+    state: _ChoicesPromptState,
+    raw_response: str,
+    file: typing.TextIO,
+) -> typing.Optional[str]:
+    """
+    Returns the canonical string for the choice selected by `raw_response`.
+
+    Returns `None` if the user should be prompted again.  If `raw_response` is
+    not a valid choice, prints an error message to `file`.
+    """
+    normalized_response = _normalize_choice_str(raw_response)
+    if not normalized_response:
+        if state.default is None:
+            return None
+        return state.choices_table[state.default]
+
+    try:
+        return state.choices_table[normalized_response]
+    except KeyError:
+        print(state.invalid_handler(raw_response), file=file)
+
+    print(file=file)
+    return None
+
+
+def _run_choices_prompt(
+    state: _ChoicesPromptState,
+    prompt: str,
+    file: typing.TextIO,
+) -> typing.Optional[str]:
+    """
+    Prompts the user until a valid choice is entered.  Returns the canonical
+    string for the selected choice or `None` if the user enters EOF.
+    """
+    # `input` always writes to `sys.stdout`; redirect its output for the
+    # duration of the prompt.
+    with contextlib.redirect_stdout(file):
+        while True:
+            try:
+                raw_response = _read_response(prompt)
+            except EOFError:
+                print(file=file)
+                return None
+
+            response = _lookup_response(state, raw_response, file)
+            if response is not None:
+                return response
 
 
 def choices_prompt(
@@ -106,7 +233,8 @@ def choices_prompt(
     the invalid input and should return an appropriate error message.  If
     `invalid_handler` is `None`, a default error message will be generated.
     `invalid_handler` can be used to provide more details about what legal
-    inputs are.
+    inputs are.  `invalid_handler` is called while `sys.stdout` is redirected
+    to `file`, so anything it prints directly will also be sent to `file`.
 
     `file` specifies the output stream to print to.  If not specified, defaults
     to `sys.stdout`.
@@ -125,68 +253,44 @@ def choices_prompt(
         # ...
     ```
     """
-    def normalize_choice_str(s: str) -> str:
-        """
-        Helper function to transform a choice string to a standard
-        representation for easier comparison later.
-        """
-        assert isinstance(s, str)
-        return s.strip().casefold()
-
     if not choices:
         return None
 
-    # Transform top-level elements that are single strings to be one-element
-    # tuples.
-    choices = [(choice,) if isinstance(choice, str) else choice
-               for choice in choices]
-
-    choices_table = {
-        normalize_choice_str(choice_str): choice_tuple[0]
-        for choice_tuple in choices
-        for choice_str in choice_tuple
-    }
-
-    if default is not None:
-        default = normalize_choice_str(default)
-        assert default in choices_table
+    state = _make_choices_prompt_state(choices,
+                                       default=default,
+                                       invalid_handler=invalid_handler)
+    return _run_choices_prompt(state, prompt, file or sys.stdout)
 
-    def default_invalid_handler(response: str) -> str:
-        return f"\"{response}\" is not a valid choice."
 
-    invalid_handler = invalid_handler or default_invalid_handler
-    file = file or sys.stdout
+@functools.lru_cache(maxsize=32)
+def _numbered_choices_prompt_state(
+    max_choice: int,
+    default_index: typing.Optional[int],
+) -> _ChoicesPromptState:
+    """
+    Returns the `_ChoicesPromptState` used by `numbered_choices_prompt` for
+    the specified number of choices.
 
-    while True:
-        try:
-            # Answering prompts with already-buffered input (particularly with
-            # empty lines) is potentially dangerous, so disallow it.
-            flush_input()
-            try:
-                # `input` always writes to `sys.stdout`; temporarily redirect
-                # its output.
-                old_stdout = sys.stdout
-                sys.stdout = file
-                raw_response = input(prompt)
-            finally:
-                sys.stdout = old_stdout
-
-            normalized_response = normalize_choice_str(raw_response)
-        except EOFError:
-            print(file=file)
-            return None
+    The result depends only on the arguments, so it is cached for callers that
+    repeatedly prompt with the same number of choices.
+    """
+    allowed_inputs = \
+        ([typing.cast(typing.Sequence[str], (str(i + 1),))
+         for i in range(max_choice)]
+         + [("?", "h", "help"), ("q", "quit")])
 
-        if not normalized_response:
-            if default is None:
-                continue
-            return choices_table[default]
+    invalid_details = (f"The entered choice must be between 1 and "
+                       f"{max_choice}, inclusive.\n"
+                       f"Enter \"help\" to show the choices again or "
+                       f"\"quit\" to quit.")
 
-        try:
-            return choices_table[normalized_response]
-        except KeyError:
-            print(invalid_handler(raw_response), file=file)
+    def invalid_handler(response: str) -> str:
+        return f"{_default_invalid_handler(response)}\n{invalid_details}"
 
-        print(file=file)
+    return _make_choices_prompt_state(
+        allowed_inputs,
+        default=None if default_index is None else str(default_index + 1),
+        invalid_handler=invalid_handler)
 
 
 def numbered_choices_prompt(
@@ -243,40 +347,26 @@ def numbered_choices_prompt(
         *((preamble,) if preamble else ()),
         *(item_formatter(f"  {i}: {choice}")
           for (i, choice) in enumerate(choices, 1)),
+        "",
     ])
 
-    print(instructions, file=file)
+    # Write the instructions as a single block rather than line by line.
+    file.write(instructions)
 
     default_hint = "" if default_index is None else f"[{default_index + 1}] "
     default_prompt = (f"[1, 2]: {default_hint}" if max_choice == 2 else
                       f"[1..{max_choice}]: {default_hint}")
     prompt = f"{prompt} {default_prompt}" if prompt else default_prompt
 
-    allowed_inputs = \
-        ([typing.cast(typing.Sequence[str], (str(i + 1),))
-         for i in range(max_choice)]
-         + [("?", "h", "help"), ("q", "quit")])
-
-    def invalid_handler(response: str) -> str:
-        return (f"\"{response}\" is not a valid choice.\n"
-                f"The entered choice must be between 1 and {max_choice}, "
-                f"inclusive.\n"
-                f"Enter \"help\" to show the choices again or \"quit\" to "
-                f"quit.")
+    state = _numbered_choices_prompt_state(max_choice, default_index)
 
     while True:
-        response = choices_prompt(
-            prompt,
-            allowed_inputs,
-            default=None if default_index is None else str(default_index + 1),
-            file=file,
-            invalid_handler=invalid_handler)
+        response = _run_choices_prompt(state, prompt, file)
         if response is None or response == "q":
             return None
 
         if response == "?":
-            print(file=file)
-            print(instructions, file=file)
+            file.write(f"\n{instructions}")
             continue
 
         choice = int(response)
@@ -4,17 +4,27 @@
 
 import contextlib
 import dataclasses
+import importlib
 import io
-import re
+import math
+import os
 import sys
+import tempfile
 import typing
 import unittest
-import unittest.mock
 
 import python_cli_utils
 
+# `python_cli_utils.choices_prompt` is the re-exported function, not the
+# module.
+choices_prompt_module = importlib.import_module(
+    "python_cli_utils.choices_prompt")
+tty_utils_module = importlib.import_module("python_cli_utils.tty_utils")
 
-whitespace = re.compile(r"\s+")
+
+# Choices shared by many `choices_prompt` tests.
+FOO_BAR_BAZ = ("Foo", "Bar", "Baz")
+CANONICAL_CHOICES = (("f", "Foo"), ("Bar",), ("Baz",))
 
 
 def fake_flush_input(*_args: typing.Any, **_kwargs: typing.Any) -> None:
@@ -23,10 +33,16 @@ def fake_flush_input(*_args: typing.Any, **_kwargs: typing.Any) -> None:
     """
 
 
-def read_contents(f: typing.TextIO) -> str:
-    """Returns the full contents of a `TextIO` stream."""
-    f.seek(0)
-    return f.read()
+def setUpModule() -> None:  # pylint: disable=invalid-name
+    """Replaces `flush_input` with `fake_flush_input` for all tests."""
+    unittest.addModuleCleanup(setattr, choices_prompt_module, "flush_input",
+                              choices_prompt_module.flush_input)
+    choices_prompt_module.flush_input = fake_flush_input
+
+
+def read_contents(f: io.StringIO) -> str:
+    """Returns the full contents of a `StringIO` stream."""
+    return f.getvalue()
 
 
 @dataclasses.dataclass
@@ -35,29 +51,38 @@ class MockedIO:
     Data class returned by `mock_io` that stores mocked versions of
     `sys.stdout` and `sys.stderr`.
     """
-    stdout: typing.TextIO
-    stderr: typing.TextIO
+    stdout: io.StringIO
+    stderr: io.StringIO
 
 
-@contextlib.contextmanager
-def mock_io(*, input: str = "") -> typing.Iterator[MockedIO]:  # pylint: disable=redefined-builtin
+class mock_io:  # pylint: disable=invalid-name
     """
     Context manager that sets up mocked versions of `sys.stdin` (with the
     specified input), `sys.stdout`, and `sys.stderr`.
-    """
-    with unittest.mock.patch("sys.stdin",
-                             new_callable=io.StringIO) as mock_stdin, \
-         unittest.mock.patch("sys.stdout",
-                             new_callable=io.StringIO) as mock_stdout, \
-         unittest.mock.patch("sys.stderr",
-                             new_callable=io.StringIO) as mock_stderr, \
-         unittest.mock.patch("python_cli_utils.flush_input", fake_flush_input):
 
-        if input:
-            mock_stdin.write(input)
-            mock_stdin.seek(0)
-
-        yield MockedIO(stdout=mock_stdout, stderr=mock_stderr)
+    This is a class rather than a `contextlib.contextmanager` generator since
+    it is entered by nearly every test.
+    """
+    def __init__(self, *, input: str = "") -> None:  # pylint: disable=redefined-builtin
+        self.input = input
+        self.original: typing.Optional[typing.Tuple[typing.TextIO,
+                                                    typing.TextIO,
+                                                    typing.TextIO]] = None
+
+    def __enter__(self) -> MockedIO:
+        # Swap the attributes directly; `unittest.mock.patch` is much more
+        # general (and expensive) than what we need.
+        self.original = (sys.stdin, sys.stdout, sys.stderr)
+        mocked_io = MockedIO(stdout=io.StringIO(), stderr=io.StringIO())
+        sys.stdin = io.StringIO(self.input)
+        sys.stdout = mocked_io.stdout
+        sys.stderr = mocked_io.stderr
+        return mocked_io
+
+    def __exit__(self, *_exc_info: typing.Any) -> None:
+        assert self.original is not None
+        (sys.stdin, sys.stdout, sys.stderr) = self.original
+        self.original = None
 
 
 def expect_test_choices(
@@ -96,113 +121,113 @@ def expect_test_choices(
 
 class TestChoicesPrompt(unittest.TestCase):
     """Tests `python_cli_utils.choices_prompt`."""
+    PROMPT = "Test message? "
+    PROMPT_X3 = PROMPT * 3
+
     def test_basic_input(self) -> None:
         """Tests that entered choices are returned."""
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input="Foo\n",
-                            expected_response="Foo")
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input="Bar\n",
-                            expected_response="Bar")
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input="Baz\n",
-                            expected_response="Baz")
+        for (test_input, expected_response) in (("Foo\n", "Foo"),
+                                                ("Bar\n", "Bar"),
+                                                ("Baz\n", "Baz")):
+            with self.subTest(input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    FOO_BAR_BAZ,
+                                    input=test_input,
+                                    expected_response=expected_response)
 
     def test_case_insensitivity(self) -> None:
         """Tests that entered choices are matched case-insensitively."""
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input="foo\n",
-                            expected_response="Foo")
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input="FOO\n",
-                            expected_response="Foo")
+        for test_input in ("foo\n", "FOO\n"):
+            with self.subTest(input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    FOO_BAR_BAZ,
+                                    input=test_input,
+                                    expected_response="Foo")
+
+    def test_unicode_case_insensitivity(self) -> None:
+        """
+        Tests that non-ASCII choices are matched using full case-folding.
+        """
+        for (choices, test_input, expected_response) in (
+            (("Straße", "Weg"), "STRASSE\n", "Straße"),
+            (("Strasse", "Weg"), "straße\n", "Strasse"),
+        ):
+            with self.subTest(choices=choices, input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    choices,
+                                    input=test_input,
+                                    expected_response=expected_response)
 
     def test_whitespace_input(self) -> None:
         """
         Tests that leading and trailing whitespace is ignored from choices.
         """
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            input=" foo \n",
-                            expected_response="Foo")
-        expect_test_choices(self,
-                            "Test message? ",
-                            (" Foo ", "Bar", "Baz"),
-                            input="foo\n",
-                            expected_response=" Foo ")
+        for (choices, test_input, expected_response) in (
+            (FOO_BAR_BAZ, " foo \n", "Foo"),
+            ((" Foo ", "Bar", "Baz"), "foo\n", " Foo "),
+        ):
+            with self.subTest(choices=choices, input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    choices,
+                                    input=test_input,
+                                    expected_response=expected_response)
 
     def test_canonical_responses(self) -> None:
         """Tests that the canonical response is returned."""
+        for test_input in ("Foo\n", "f\n", "foo\n"):
+            with self.subTest(input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    CANONICAL_CHOICES,
+                                    input=test_input,
+                                    expected_response="f")
+
+    def test_empty_choice_tuple(self) -> None:
+        """Tests that empty tuples in the choices are ignored."""
         expect_test_choices(self,
-                            "Test message? ",
-                            (("f", "Foo"), ("Bar",), ("Baz",)),
-                            input="Foo\n",
-                            expected_response="f")
-        expect_test_choices(self,
-                            "Test message? ",
-                            (("f", "Foo"), ("Bar",), ("Baz",)),
-                            input="f\n",
-                            expected_response="f")
-        expect_test_choices(self,
-                            "Test message? ",
-                            (("f", "Foo"), ("Bar",), ("Baz",)),
+                            self.PROMPT,
+                            ("Foo", (), ("Bar",)),
                             input="foo\n",
-                            expected_response="f")
+                            expected_response="Foo")
 
     def test_default_input(self) -> None:
         """
         Tests that the default choice is returned if an empty line is entered.
         """
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            default="Foo",
-                            input="\n",
-                            expected_response="Foo")
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            default="Foo",
-                            input=" \n",
-                            expected_response="Foo")
-        expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
-                            default="foo",
-                            input="\n",
-                            expected_response="Foo")
+        for (default, test_input) in (("Foo", "\n"),
+                                      ("Foo", " \n"),
+                                      ("foo", "\n")):
+            with self.subTest(default=default, input=test_input):
+                expect_test_choices(self,
+                                    self.PROMPT,
+                                    FOO_BAR_BAZ,
+                                    default=default,
+                                    input=test_input,
+                                    expected_response="Foo")
 
     def test_no_default(self) -> None:
         """
         Tests that the prompt is repeated if an empty line is entered with no
         default.
         """
-        prompt = "Test message? "
         expect_test_choices(
             self,
-            prompt,
-            ("Foo", "Bar", "Baz"),
+            self.PROMPT,
+            FOO_BAR_BAZ,
             input="\n\n",
-            expected_stdout=prompt * 3,
+            expected_stdout=self.PROMPT_X3,
             expected_response=None,
         )
 
     def test_eof(self) -> None:
         """Tests that `None` is returned if there is no input."""
         expect_test_choices(self,
-                            "Test message? ",
-                            ("Foo", "Bar", "Baz"),
+                            self.PROMPT,
+                            FOO_BAR_BAZ,
                             input="",
                             expected_response=None)
 
@@ -211,37 +236,29 @@ class TestChoicesPrompt(unittest.TestCase):
         Tests that the prompt is repeated with an appropriate error message if
         invalid input is entered.
         """
-        expect_test_choices(
-            self,
-            "Test message? ",
-            ("Foo", "Bar", "Baz"),
-            input="qux",
-            expected_stdout="Test message? "
-                            "\"qux\" is not a valid choice.\n"
-                            "\n"
-                            "Test message? ",
-            expected_response=None,
-        )
-
-        expect_test_choices(
-            self,
-            "Test message? ",
-            (("f", "Foo"), ("Bar",), ("Baz",)),
-            input="fo",
-            expected_stdout="Test message? "
-                            "\"fo\" is not a valid choice.\n"
-                            "\n"
-                            "Test message? ",
-            expected_response=None,
-        )
+        for (choices, test_input) in ((FOO_BAR_BAZ, "qux"),
+                                      (CANONICAL_CHOICES, "fo")):
+            with self.subTest(choices=choices, input=test_input):
+                expect_test_choices(
+                    self,
+                    self.PROMPT,
+                    choices,
+                    input=test_input,
+                    expected_stdout=f"{self.PROMPT}"
+                                    f"\"{test_input}\" is not a valid "
+                                    f"choice.\n"
+                                    f"\n"
+                                    f"{self.PROMPT}",
+                    expected_response=None,
+                )
 
     def test_invalid_default(self) -> None:
         """Tests that the default value must match one of the choices."""
         with mock_io():
             self.assertRaises(AssertionError,
                               python_cli_utils.choices_prompt,
-                              prompt="Test message? ",
-                              choices=("Foo", "Bar", "Baz"),
+                              prompt=self.PROMPT,
+                              choices=FOO_BAR_BAZ,
                               default="qux")
 
     def test_no_choices(self) -> None:
@@ -250,12 +267,37 @@ class TestChoicesPrompt(unittest.TestCase):
         empty.
         """
         with mock_io() as mocked_io:
-            response = python_cli_utils.choices_prompt("Test message? ", ())
+            response = python_cli_utils.choices_prompt(self.PROMPT, ())
             self.assertIs(response, None)
             self.assertFalse(read_contents(mocked_io.stdout))
             self.assertFalse(read_contents(mocked_io.stderr))
 
 
+# Expected output from `TestNumberedChoicesPrompt.test_invalid_input`.
+NUMBERED_INVALID_INPUT_OUTPUT = (
+    "Instructions\n"
+    "  1: foo\n"
+    "  2: bar\n"
+    "  3: baz\n"
+    "[1..3]: "
+    "\"0\" is not a valid choice.\n"
+    "The entered choice must be between 1 and 3, inclusive.\n"
+    "Enter \"help\" to show the choices again or \"quit\" to quit.\n"
+    "\n"
+    "[1..3]: "
+    "\"x\" is not a valid choice.\n"
+    "The entered choice must be between 1 and 3, inclusive.\n"
+    "Enter \"help\" to show the choices again or \"quit\" to quit.\n"
+    "\n"
+    "[1..3]: \n"
+    "Instructions\n"
+    "  1: foo\n"
+    "  2: bar\n"
+    "  3: baz\n"
+    "[1..3]: "
+)
+
+
 class TestNumberedChoicesPrompt(unittest.TestCase):
     """Tests `python_cli_utils.numbered_choices_prompt`."""
     def test_instructions(self) -> None:
@@ -322,61 +364,185 @@ class TestNumberedChoicesPrompt(unittest.TestCase):
                              "[1..3]: [1] ")
             self.assertEqual(read_contents(mocked_io.stderr), "")
 
-    def test_invalid_input(self) -> None:
+    def test_numeric_input(self) -> None:
         """
-        Tests that the prompt is repeated with an appropriate error message if
-        invalid input is entered.
+        Tests that surrounding whitespace is ignored from entered numbers and
+        that numbers with leading zeroes or too many digits are rejected.
         """
-        choices = ("foo", "bar", "baz")
-        preamble = "Instructions"
+        with mock_io(input=" 3 \n") as mocked_io:
+            response = python_cli_utils.numbered_choices_prompt(
+                ("foo", "bar", "baz"),
+            )
+            self.assertEqual(response, 2)
+            self.assertEqual(read_contents(mocked_io.stderr), "")
 
-        test_input = "0\nx\nhelp\nquit\n"
-        expected_output = (
-            "Instructions\n"
-            "  1: foo\n"
-            "  2: bar\n"
-            "  3: baz\n"
-            "[1..3]: "
-            "\"0\" is not a valid choice.\n"
-            "The entered choice must be between 1 and 3, inclusive.\n"
-            "Enter \"help\" to show the choices again or \"quit\" to quit.\n"
-            "\n"
-            "[1..3]: "
-            "\"x\" is not a valid choice.\n"
+        # A number longer than `int`'s default conversion limit.
+        long_number = "9" * 5000
+
+        invalid_details = (
             "The entered choice must be between 1 and 3, inclusive.\n"
             "Enter \"help\" to show the choices again or \"quit\" to quit.\n"
             "\n"
-            "[1..3]: \n"
-            "Instructions\n"
-            "  1: foo\n"
-            "  2: bar\n"
-            "  3: baz\n"
-            "[1..3]: "
         )
 
-        with mock_io(input=test_input) as mocked_io:
+        with mock_io(input=f"03\n4\n{long_number}\n2\n") as mocked_io:
             response = python_cli_utils.numbered_choices_prompt(
-                choices,
-                preamble=preamble,
+                ("foo", "bar", "baz"),
+            )
+            self.assertEqual(response, 1)
+            self.assertMultiLineEqual(
+                read_contents(mocked_io.stdout),
+                "  1: foo\n"
+                "  2: bar\n"
+                "  3: baz\n"
+                "[1..3]: "
+                "\"03\" is not a valid choice.\n"
+                f"{invalid_details}"
+                "[1..3]: "
+                "\"4\" is not a valid choice.\n"
+                f"{invalid_details}"
+                "[1..3]: "
+                f"\"{long_number}\" is not a valid choice.\n"
+                f"{invalid_details}"
+                "[1..3]: ",
             )
-            self.assertIs(response, None)
-            self.assertEqual(read_contents(mocked_io.stdout), expected_output)
             self.assertEqual(read_contents(mocked_io.stderr), "")
 
-        # Test that all output can be sent to `sys.stderr` instead.
-        with mock_io(input=test_input) as mocked_io:
-            response = python_cli_utils.numbered_choices_prompt(
-                choices,
-                preamble=preamble,
-                file=sys.stderr
-            )
-            self.assertIs(response, None)
-            self.assertEqual(read_contents(mocked_io.stdout), "")
-            self.assertEqual(read_contents(mocked_io.stderr), expected_output)
+    def test_invalid_input(self) -> None:
+        """
+        Tests that the prompt is repeated with an appropriate error message if
+        invalid input is entered.
+        """
+        choices = ("foo", "bar", "baz")
+        preamble = "Instructions"
+
+        test_input = "0\nx\nhelp\nquit\n"
+
+        # Test both the default output stream and that all output can be sent
+        # to `sys.stderr` instead.  The stream is named rather than passed
+        # directly since it must be looked up after `mock_io` replaces it.
+        for (file_name, expected_stdout, expected_stderr) in (
+            (None, NUMBERED_INVALID_INPUT_OUTPUT, ""),
+            ("stderr", "", NUMBERED_INVALID_INPUT_OUTPUT),
+        ):
+            with self.subTest(file=file_name), \
+                 mock_io(input=test_input) as mocked_io:
+                response = python_cli_utils.numbered_choices_prompt(
+                    choices,
+                    preamble=preamble,
+                    file=getattr(sys, file_name) if file_name else None,
+                )
+                self.assertIs(response, None)
+                self.assertMultiLineEqual(read_contents(mocked_io.stdout),
+                                          expected_stdout)
+                self.assertMultiLineEqual(read_contents(mocked_io.stderr),
+                                          expected_stderr)
 
 
 class TestTTYUtils(unittest.TestCase):
     """Tests `tty_utils` functions."""
+    def test_terminal_size(self) -> None:
+        """
+        Tests that `python_cli_utils.terminal_size` reports an unbounded size
+        when `sys.stdout` is not a TTY.
+        """
+        with mock_io():
+            self.assertEqual(tuple(python_cli_utils.terminal_size()),
+                             (math.inf, math.inf))
+
+    def test_stdout_isatty_cache(self) -> None:
+        """
+        Tests that the cached result of whether `sys.stdout` is a TTY is
+        reused for the same stream and recomputed when `sys.stdout` is
+        replaced.
+        """
+        class FakeTTY(io.StringIO):
+            """A `StringIO` that claims to be a TTY and counts queries."""
+            isatty_calls = 0
+
+            def isatty(self) -> bool:
+                self.isatty_calls += 1
+                return True
+
+        stdout_isatty = tty_utils_module._stdout_isatty  # pylint: disable=protected-access
+
+        fake_tty = FakeTTY()
+        with contextlib.redirect_stdout(fake_tty):
+            self.assertTrue(stdout_isatty())
+            self.assertTrue(stdout_isatty())
+            self.assertEqual(fake_tty.isatty_calls, 1)
+
+        with mock_io():
+            self.assertFalse(stdout_isatty())
+
+        with contextlib.redirect_stdout(FakeTTY()):
+            self.assertTrue(stdout_isatty())
+
+        with mock_io():
+            self.assertFalse(stdout_isatty())
+
+    def test_paged_output_binary_not_tty(self) -> None:
+        """
+        Tests that `python_cli_utils.paged_output` with `binary=True` writes to
+        the underlying buffer of `sys.stdout` when it is not a TTY, in order
+        with text output.
+        """
+        raw_stdout = io.BytesIO()
+        text_stdout = io.TextIOWrapper(raw_stdout, encoding="utf-8")
+        with contextlib.redirect_stdout(text_stdout):
+            print("text 1")
+            with python_cli_utils.paged_output(binary=True) as out:
+                out.write(b"binary\n")
+                with python_cli_utils.paged_output() as nested_out:
+                    print("text 2", file=nested_out)
+            text_stdout.flush()
+            self.assertEqual(raw_stdout.getvalue(),
+                             b"text 1\nbinary\ntext 2\n")
+
+    def test_paged_output_binary_without_buffer(self) -> None:
+        """
+        Tests that `python_cli_utils.paged_output` with `binary=True` raises
+        `TypeError` if `sys.stdout` has no underlying binary buffer.
+        """
+        with mock_io():
+            with self.assertRaises(TypeError):
+                with python_cli_utils.paged_output(binary=True):
+                    pass
+
+    @unittest.skipUnless(os.name == "posix", "Requires executable scripts.")
+    def test_paged_output_nested_pager(self) -> None:
+        """
+        Tests that nested text and binary `python_cli_utils.paged_output`
+        contexts share one pager and preserve the order of output.
+        """
+        self.addCleanup(setattr, tty_utils_module, "_stdout_isatty",
+                        tty_utils_module._stdout_isatty)  # pylint: disable=protected-access
+        tty_utils_module._stdout_isatty = lambda: True  # pylint: disable=protected-access
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # A fake pager that copies its input to a file.
+            output_path = os.path.join(temp_dir, "output")
+            pager_path = os.path.join(temp_dir, "pager")
+            with open(pager_path, "w", encoding="utf-8") as f:
+                f.write(f"#!{sys.executable}\n"
+                        f"import shutil\n"
+                        f"import sys\n"
+                        f"with open({output_path!r}, \"wb\") as f:\n"
+                        f"    shutil.copyfileobj(sys.stdin.buffer, f)\n")
+            os.chmod(pager_path, 0o755)
+
+            with python_cli_utils.paged_output(pager_path) as out:
+                print("text 1", file=out)
+                with python_cli_utils.paged_output(binary=True) as binary_out:
+                    binary_out.write(b"binary\n")
+                    with python_cli_utils.paged_output() as nested_out:
+                        print("text 2", file=nested_out)
+                print("text 3", file=out)
+
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(),
+                                 b"text 1\nbinary\ntext 2\ntext 3\n")
+
     def test_ellipsize(self) -> None:
         """Tests `python_cli_utils.ellipsize`."""
         ellipsize = python_cli_utils.ellipsize
@@ -20,25 +20,48 @@ Miscellaneous utility functions for interactive terminals.
 """
 
 import contextlib
+import functools
+import io
 import math
 import os
 import shutil
-import subprocess
 import sys
 import typing
 
 
+__stdout_isatty_cache: typing.Optional[typing.Tuple[typing.TextIO,
+                                                     bool]] = None
+
+
+def _stdout_isatty() -> bool:
+    """
+    Returns whether `sys.stdout` is a TTY.
+
+    The result is cached to avoid a system call on every check.  The cache is
+    tied to the current `sys.stdout` object, so reassigning `sys.stdout` (such
+    as with `contextlib.redirect_stdout`) invalidates it.
+    """
+    global __stdout_isatty_cache
+    stdout = sys.stdout
+    if __stdout_isatty_cache is None or __stdout_isatty_cache[0] is not stdout:
+        __stdout_isatty_cache = (stdout, stdout.isatty())
+    return __stdout_isatty_cache[1]
+
+
 def terminal_size() -> os.terminal_size:
     """
     Returns the terminal size.
 
     Returns `(math.inf, math.inf)` if stdout is not a TTY.
     """
-    if not sys.stdout.isatty():
+    if not _stdout_isatty():
         return os.terminal_size((math.inf, math.inf))  # type: ignore
     return shutil.get_terminal_size()
 
 
+__ellipsis = "..."
+
+
 def ellipsize(s: str, width: int) -> str:
     """
     Truncates a string to the specified maximum width (in code points).
@@ -53,21 +76,31 @@ def ellipsize(s: str, width: int) -> str:
     if len(s) <= width:
         return s
 
-    ellipsis = "..."
-    if width < len(ellipsis):
+    if width < len(__ellipsis):
         return s[:width]
 
-    s = s[:(width - len(ellipsis))] + ellipsis
-    assert len(s) == width
-    return s
+    return s[:(width - len(__ellipsis))] + __ellipsis
 
 
-__current_paged_output_proc: typing.Optional[subprocess.Popen] = None
+@functools.lru_cache(maxsize=None)
+def _default_pager() -> typing.Optional[str]:
+    """
+    Returns the path to `less` or to `more` if `less` isn't available.
+
+    The result is cached to avoid repeatedly searching the executable search
+    path.  Call `_default_pager.cache_clear()` if `PATH` changes.
+    """
+    return shutil.which("less") or shutil.which("more")
+
+
+__current_paged_output_stream: typing.Optional[io.TextIOWrapper] = None
 
 
 @contextlib.contextmanager
 def paged_output(
     pager: typing.Optional[str] = None,
+    *,
+    binary: bool = False,
 ) -> typing.Generator[typing.IO[typing.Any], None, None]:
     """
     Context manager that spawns the user's pager.  Writes to the yielded stream
@@ -79,6 +112,11 @@ def paged_output(
     `PAGER` environment variable.  If `PAGER` is not specified, defaults to
     `less` and then to `more` from the executable search path.
 
+    If `binary` is true, the yielded stream accepts `bytes` instead of `str`,
+    which avoids the cost of encoding for callers that already have encoded
+    output.  `sys.stdout` must then have an underlying binary `buffer`;
+    otherwise `TypeError` is raised.
+
     Examples:
     ```python
     with paged_output() as out:
@@ -99,42 +137,65 @@ def paged_output(
             # stream referred to by `sys.stdout`, so it still must be specified
             # explicitly.
             subprocess.run(command, stdout=sys.stdout)
+
+    # Or write already-encoded output:
+    with paged_output(binary=True) as out:
+        out.write(data)
     ```
     """
+    def select_stream(text_stream: typing.TextIO) -> typing.IO[typing.Any]:
+        if not binary:
+            return text_stream
+
+        buffer = getattr(text_stream, "buffer", None)
+        if buffer is None:
+            raise TypeError(f"Binary output requires a text stream with an "
+                            f"underlying binary buffer: {text_stream!r}")
+
+        # Don't let previously written text end up after the binary output.
+        text_stream.flush()
+        return buffer
+
     # Paging is appropriate only for interactive terminals.
-    if not sys.stdout.isatty():
-        yield sys.stdout
+    if not _stdout_isatty():
+        yield select_stream(sys.stdout)
         return
 
     # Don't spawn multiple pager processes if we're already within a
     # `pager_output` context.
-    global __current_paged_output_proc
-    if __current_paged_output_proc is not None:
-        assert __current_paged_output_proc.stdin is not None
-        yield __current_paged_output_proc.stdin
+    global __current_paged_output_stream
+    if __current_paged_output_stream is not None:
+        yield select_stream(__current_paged_output_stream)
         return
 
-    pager = (pager
-             or os.environ.get("PAGER")
-             or shutil.which("less")
-             or shutil.which("more"))
+    pager = pager or os.environ.get("PAGER") or _default_pager()
     if not pager:
-        yield sys.stdout
+        yield select_stream(sys.stdout)
         return
 
+    # `subprocess` is relatively expensive to import and is needed only when
+    # actually spawning a pager.
+    import subprocess  # pylint: disable=import-outside-toplevel
+
     try:
-        proc = subprocess.Popen((pager,),
-                                stdin=subprocess.PIPE,
-                                universal_newlines=True)
+        # Open the pipe in binary mode and do any text encoding ourselves so
+        # that binary output can bypass it.
+        proc = subprocess.Popen((pager,), stdin=subprocess.PIPE)
     except OSError as e:
         print(f"Failed to spawn pager: {e}", file=sys.stderr)
-        yield sys.stdout
+        yield select_stream(sys.stdout)
         return
 
     with proc:
-        __current_paged_output_proc = proc
         assert proc.stdin is not None
+
+        # This matches the text stream that `subprocess.Popen` would create
+        # with `universal_newlines=True`.  Using `write_through` ensures that
+        # nothing is buffered in the text layer, so text and binary writes
+        # from nested contexts stay in order.
+        text_stream = io.TextIOWrapper(proc.stdin, write_through=True)
+        __current_paged_output_stream = text_stream
         try:
-            yield proc.stdin
+            yield select_stream(text_stream)
         finally:
-            __current_paged_output_proc = None
+            __current_paged_output_stream = None